@@ -29,7 +29,7 @@ class AbstractLambda:
 
     def lambda_handler(self, event, context):
         try:
-            _LOG.debug(f'Request: {event}')
+            _LOG.debug('Request: %s', event)
             if event.get('warm_up'):
                 return
             errors = self.validate_request(event=event)
@@ -38,14 +38,14 @@ class AbstractLambda:
                                       content=errors)
             execution_result = self.handle_request(event=event,
                                                    context=context)
-            _LOG.debug(f'Response: {execution_result}')
+            _LOG.debug('Response: %s', execution_result)
             return execution_result
         except ApplicationException as e:
-            _LOG.error(f'Error occurred; Event: {event}; Error: {e}')
+            _LOG.error('Error occurred; Event: %s; Error: %s', event, e)
             return build_response(code=e.code,
                                   content=e.content)
         except Exception as e:
             _LOG.error(
-                f'Unexpected error occurred; Event: {event}; Error: {e}')
+                'Unexpected error occurred; Event: %s; Error: %s', event, e)
             return build_response(code=500,
                                   content='Internal server error')
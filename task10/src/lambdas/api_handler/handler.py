@@ -1,13 +1,21 @@
-import datetime
-import decimal
-import json
-import traceback
+import bisect
+import functools
+import itertools
+import operator
+import os
 import typing as t
-import uuid
 import re
+import time
+from decimal import Decimal
 
-import boto3
+import orjson
 
+from commons import (
+    RESPONSE_SERVICE_UNAVAILABLE_CODE,
+    RESPONSE_UNAUTHORIZED,
+    ApplicationException,
+    raise_error_response,
+)
 from commons.log_helper import get_logger
 from commons.abstract_lambda import AbstractLambda
 
@@ -16,9 +24,138 @@ PREFIX = "cmtr-62505701-"
 SUFFIX="-test"
 USER_POOL_NAME = f"{PREFIX}simple-booking-userpool{SUFFIX}"
 USER_POOL_CLIENT_NAME = "simple-booking-client"
-cognito_client = boto3.client("cognito-idp")
-tables_table = boto3.resource("dynamodb").Table(f"{PREFIX}Tables{SUFFIX}")
-reservations_table = boto3.resource("dynamodb").Table(f"{PREFIX}Reservations{SUFFIX}")
+TABLES_TABLE_NAME = f"{PREFIX}Tables{SUFFIX}"
+RESERVATIONS_TABLE_NAME = f"{PREFIX}Reservations{SUFFIX}"
+RESERVATION_LOCKS_TABLE_NAME = f"{PREFIX}ReservationLocks{SUFFIX}"
+# One lock item per table and date holds that day's booked [start, end)
+# minute ranges and a version number. A booking rewrites it in the same
+# conditional transaction as the reservation, so concurrent bookings for
+# the same table and day cannot both succeed.
+LOCK_ATTEMPTS = 3
+# Attributes returned to API clients; "number" and "date" are DynamoDB
+# reserved words and have to go through expression attribute names.
+TABLE_PROJECTION = "id, #n, places, isVip, minOrder"
+TABLE_ATTRIBUTE_NAMES = {"#n": "number"}
+RESERVATION_PROJECTION = "id, tableNumber, clientName, phoneNumber, #d, slotTimeStart, slotTimeEnd"
+RESERVATION_ATTRIBUTE_NAMES = {"#d": "date"}
+
+# Clients are created on first use so a cold start only pays for the
+# services the invoked route actually talks to. They all share a single
+# session, so credentials and endpoints are resolved only once.
+_session = None
+_dynamodb_client = None
+_cognito_client = None
+_type_serializer = None
+_type_deserializer = None
+
+# API Gateway's Cognito authorizer already guards protected routes; set the
+# verify_tokens environment variable to "true" to also verify ID tokens here.
+VERIFY_TOKENS = os.environ.get("verify_tokens", "").lower() == "true"
+
+# Cognito signing keys by kid. They are fetched once and only refreshed when
+# a token names an unknown kid, at most once per JWKS_REFRESH_SECONDS.
+JWKS_REFRESH_SECONDS = 300
+_jwks = {}
+_jwks_fetched_at = None
+
+
+def get_session():
+    global _session
+    if _session is None:
+        import boto3
+
+        _session = boto3.session.Session()
+        _session.get_credentials()
+    return _session
+
+
+def create_client(service_name: str):
+    from botocore.config import Config
+
+    # Keep-alive lets warm invocations reuse the established TLS connection.
+    config = Config(tcp_keepalive=True, retries={"mode": "standard", "max_attempts": 2})
+    return get_session().client(service_name, config=config)
+
+
+def get_dynamodb_client():
+    # The low-level client skips the boto3.resources layer; items are
+    # converted with the shared serializers from get_type_converters.
+    global _dynamodb_client
+    if _dynamodb_client is None:
+        _dynamodb_client = create_client("dynamodb")
+    return _dynamodb_client
+
+
+def get_cognito_client():
+    global _cognito_client
+    if _cognito_client is None:
+        _cognito_client = create_client("cognito-idp")
+    return _cognito_client
+
+
+def get_type_converters():
+    global _type_serializer, _type_deserializer
+    if _type_serializer is None:
+        from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+        _type_serializer = TypeSerializer()
+        _type_deserializer = TypeDeserializer()
+    return _type_serializer, _type_deserializer
+
+
+def serialize_item(item: dict) -> dict:
+    serialize = get_type_converters()[0].serialize
+    return {key: serialize(value) for key, value in item.items()}
+
+
+def deserialize_item(item: dict) -> dict:
+    deserialize = get_type_converters()[1].deserialize
+    return {key: deserialize(value) for key, value in item.items()}
+
+
+_EMAIL_RE = re.compile(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$")
+_PASSWORD_RE = re.compile(r"^(?=.*[a-zA-Z])(?=.*\d)(?=.*[^\w\s]).{12,}$")
+_TABLE_ID_RE = re.compile(r"^/tables/(\d+)$")
+_SLOT_TIME_RE = re.compile(r"^([01]?\d|2[0-3]):([0-5]?\d)$")
+
+
+def _default(obj: t.Any) -> t.Any:
+    if isinstance(obj, Decimal):
+        return int(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def _dumps(data: t.Any) -> str:
+    return orjson.dumps(data, default=_default).decode()
+
+
+def _parse_event(event: dict) -> tuple[str, str, t.Optional[str]]:
+    # Unpacks the proxy event once; the body stays raw so routes that do not
+    # need it never pay for JSON parsing.
+    request_context = event["requestContext"]
+    path: str = request_context["path"]
+    return request_context["httpMethod"], path.removeprefix("/api"), event.get("body")
+
+
+def _loads_body(raw_body: t.Optional[str]) -> dict:
+    if raw_body:
+        return orjson.loads(raw_body)
+    return {}
+
+
+def _dumps_items(key: str, items: t.Iterable[t.Any]) -> str:
+    # Encodes {key: [items...]} one item at a time so the items can be
+    # streamed from the paginator instead of being held in a second list.
+    body = bytearray(b"{")
+    body += orjson.dumps(key)
+    body += b":["
+    for index, item in enumerate(items):
+        if index:
+            body += b","
+        body += orjson.dumps(item, default=_default)
+    body += b"]}"
+    return body.decode()
+
 
 class ApiHandler(AbstractLambda):
 
@@ -27,156 +164,164 @@ class ApiHandler(AbstractLambda):
 
     def handle_request(self, event: dict, context: dict) -> dict:
 
-        _LOG.info(f"Event: {event}")
+        _LOG.debug("Event: %s", event)
         try:
-            method = event["requestContext"]["httpMethod"]
-            path:str = event["requestContext"]["path"]
-
-            if path.startswith("/api"):
-                path = path.replace("/api", "")
+            method, path, raw_body = _parse_event(event)
+            _LOG.info("Method: %s, Path: %s", method, path)
+
+            route = _ROUTES.get((method, path))
+            match = None
+            if route is None:
+                for route_method, pattern, param_route in _PARAM_ROUTES:
+                    if route_method == method and (match := pattern.match(path)):
+                        route = param_route
+                        break
+                else:
+                    _LOG.error("Path not found: %s", path)
+                    return {
+                        "statusCode": 404,
+                        "body": "Not Found"
+                    }
+
+            if VERIFY_TOKENS and (method, path) not in _PUBLIC_ROUTES:
+                self.authorize_user(event)
+
+            return route(self, raw_body, match)
+        except ApplicationException as e:
+            _LOG.error("Request rejected: %s", e)
+            return {"statusCode": e.code, "body": e.content}
+        except Exception as e:
+            _LOG.error("Failed to handle request: %s", e, exc_info=True)
+            _LOG.error("Event: %s, Context: %s", event, context)
+            return {"statusCode": 400}
 
-            request_body = {}
+    def _handle_signup(self, raw_body: t.Optional[str], match: t.Optional[re.Match]) -> dict:
+        request_body = _loads_body(raw_body)
+        email = request_body["email"]
+        first_name = request_body["firstName"]
+        last_name = request_body["lastName"]
+        password = request_body["password"]
 
-            if "body" in event and event["body"]:
-                request_body = json.loads(event["body"])
+        self.signup(email, first_name, last_name, password)
 
-            _LOG.info(f"Method: {method}, Path: {path}, Request body: {request_body}")
+        return {"statusCode": 200}
 
-            if method == "POST" and path == "/signup":
-                email = request_body["email"]
-                first_name = request_body["firstName"]
-                last_name = request_body["lastName"]
-                password = request_body["password"]
+    def _handle_signin(self, raw_body: t.Optional[str], match: t.Optional[re.Match]) -> dict:
+        request_body = _loads_body(raw_body)
+        email = request_body["email"]
+        password = request_body["password"]
 
-                self.signup(email, first_name, last_name, password)
+        access_token = self.signin(email, password)
 
-                return {"statusCode": 200}
-            elif method == "POST" and path == "/signin":
-                email = request_body["email"]
-                password = request_body["password"]
+        return {
+            "statusCode": 200,
+            "body": _dumps({"accessToken": access_token})
+        }
 
-                access_token = self.signin(email, password)
+    def _handle_list_tables(self, raw_body: t.Optional[str], match: t.Optional[re.Match]) -> dict:
+        body = _dumps_items("tables", self.get_tables())
+        _LOG.debug("Tables: %s", body)
 
-                return {
-                    "statusCode": 200,
-                    "body": json.dumps({"accessToken": access_token})
-                }
-            elif method == "GET" and path == "/tables":
-                # self.authorize_user(event)
+        return {
+            "statusCode": 200,
+            "body": body
+        }
 
-                tables = self.get_tables()
-                _LOG.info(f"Tables: {tables}")
+    def _handle_create_table(self, raw_body: t.Optional[str], match: t.Optional[re.Match]) -> dict:
+        request_body = _loads_body(raw_body)
+        id = int(request_body["id"])
+        number = int(request_body["number"])
+        places = int(request_body["places"])
+        is_vip = bool(request_body["isVip"])
+        min_order = None
+        if "minOrder" in request_body:
+            min_order = int(request_body["minOrder"])
+
+        table_id = self.create_table(id, number, places, is_vip, min_order)
+
+        return {
+            "statusCode": 200,
+            "body": _dumps({
+                "id": table_id
+            })
+        }
 
-                return {
-                    "statusCode": 200,
-                    "body": json.dumps({
-                        "tables": tables
-                    })
-                }
-            elif method == "POST" and path == "/tables":
-                # self.authorize_user(event)
-                id = int(request_body["id"])
-                number = int(request_body["number"])
-                places = int(request_body["places"])
-                is_vip = bool(request_body["isVip"])
-                min_order = None
-                if "minOrder" in request_body:
-                    min_order = int(request_body["minOrder"])
-
-                table_id = self.create_table(id, number, places, is_vip, min_order)
-
-                return {
-                    "statusCode": 200,
-                    "body": json.dumps({
-                        "id": table_id
-                    })
-                }
-            elif method == "GET" and re.match(r"^/tables/\d+$", path):
-                # self.authorize_user(event)
-                table_id = int(path.split("/")[-1])
+    def _handle_get_table(self, raw_body: t.Optional[str], match: t.Optional[re.Match]) -> dict:
+        table_id = int(match.group(1))
 
-                table = self.get_table(table_id)
-                _LOG.info(f"Table: {table}")
+        table = self.get_table(table_id)
+        _LOG.debug("Table: %s", table)
 
-                return {
-                    "statusCode": 200,
-                    "body": json.dumps(table)
-                }
-            elif method == "POST" and path == "/reservations":
-                # self.authorize_user(event)
-                table_number = int(request_body["tableNumber"])
-                client_name = request_body["clientName"]
-                phone_number = request_body["phoneNumber"]
-                date = request_body["date"]
-                slot_time_start = request_body["slotTimeStart"]
-                slot_time_end = request_body["slotTimeEnd"]
-
-                reservation = self.create_reservation(
-                    table_number, 
-                    client_name, 
-                    phone_number, 
-                    date, 
-                    slot_time_start, 
-                    slot_time_end
-                )
-                _LOG.info(f"Reservation: {reservation}")
-
-                return {
-                    "statusCode": 200,
-                    "body": json.dumps({"reservationId": reservation})
-                }
-            elif method == "GET" and path == "/reservations":
-                # self.authorize_user(event)
+        return {
+            "statusCode": 200,
+            "body": _dumps(table)
+        }
 
-                reservations = self.get_reservations()
-                _LOG.info(f"Reservations: {reservations}")
+    def _handle_create_reservation(self, raw_body: t.Optional[str], match: t.Optional[re.Match]) -> dict:
+        request_body = _loads_body(raw_body)
+        table_number = int(request_body["tableNumber"])
+        client_name = request_body["clientName"]
+        phone_number = request_body["phoneNumber"]
+        date = request_body["date"]
+        slot_time_start = request_body["slotTimeStart"]
+        slot_time_end = request_body["slotTimeEnd"]
+
+        reservation = self.create_reservation(
+            table_number, 
+            client_name, 
+            phone_number, 
+            date, 
+            slot_time_start, 
+            slot_time_end
+        )
+        _LOG.info("Reservation: %s", reservation)
 
-                return {
-                    "statusCode": 200,
-                    "body": json.dumps({
-                        "reservations": reservations
-                    })
-                }
-            else:
-                _LOG.error(f"Path not found: {path}")
-                return {
-                    "statusCode": 404,
-                    "body": "Not Found"
-                }
-        except Exception as e:
-            _LOG.error(f"Failed to handle request: {e}\n{traceback.format_exc()}")
-            _LOG.error(f"Event: {event}, Context: {context}")
-            return {"statusCode": 400}
+        return {
+            "statusCode": 200,
+            "body": _dumps({"reservationId": reservation})
+        }
 
-    def get_user_pool_id(self, user_pool_name: str) -> str:
+    def _handle_list_reservations(self, raw_body: t.Optional[str], match: t.Optional[re.Match]) -> dict:
+        body = _dumps_items("reservations", self.get_reservations())
+        _LOG.debug("Reservations: %s", body)
 
-        user_pool_id = None
-        response = cognito_client.list_user_pools(MaxResults=50)
-        _LOG.info(f"User pools: {response}")
+        return {
+            "statusCode": 200,
+            "body": body
+        }
 
+    @staticmethod
+    @functools.lru_cache(maxsize=1)
+    def get_user_pool_id(user_pool_name: str) -> str:
+        # Pool and client IDs are fixed for the deployed stack, so they are
+        # resolved once per container and reused by warm invocations.
         user_pool_id = None
-        for user_pool in response["UserPools"]:
-            if user_pool["Name"] == user_pool_name:
-                user_pool_id = user_pool["Id"]
+        paginator = get_cognito_client().get_paginator("list_user_pools")
+        for page in paginator.paginate(MaxResults=50):
+            for user_pool in page["UserPools"]:
+                if user_pool["Name"] == user_pool_name:
+                    user_pool_id = user_pool["Id"]
+                    break
+            if user_pool_id is not None:
                 break
 
         if user_pool_id is None:
-            raise ValueError(f"User pool {USER_POOL_NAME} not found")
+            raise ValueError(f"User pool {user_pool_name} not found")
 
         return user_pool_id
 
-    def get_user_pool_client_id(self, user_pool_id: str) -> str:
+    @staticmethod
+    @functools.lru_cache(maxsize=1)
+    def get_user_pool_client_id(user_pool_id: str) -> str:
 
         client_id = None
-        response = cognito_client.list_user_pool_clients(
-            UserPoolId=user_pool_id,
-            MaxResults=50
-        )
-        _LOG.info(f"User pool clients: {response}")
-
-        for client in response["UserPoolClients"]:
-            if client["ClientName"] == USER_POOL_CLIENT_NAME:
-                client_id = client["ClientId"]
+        paginator = get_cognito_client().get_paginator("list_user_pool_clients")
+        for page in paginator.paginate(UserPoolId=user_pool_id, MaxResults=50):
+            for client in page["UserPoolClients"]:
+                if client["ClientName"] == USER_POOL_CLIENT_NAME:
+                    client_id = client["ClientId"]
+                    break
+            if client_id is not None:
                 break
 
         if client_id is None:
@@ -184,36 +329,84 @@ class ApiHandler(AbstractLambda):
 
         return client_id
 
-    def serialize(self, data: t.Any) -> t.Any:
+    def get_signing_key(self, user_pool_id: str, kid: str) -> t.Any:
+        global _jwks_fetched_at
+        import jwt
 
-        if isinstance(data, list):
-            return [self.serialize(item) for item in data]
-        elif isinstance(data, dict):
-            return {key: self.serialize(value) for key, value in data.items()}
-        elif isinstance(data, decimal.Decimal):
-            return int(data)
+        refresh_due = (
+            _jwks_fetched_at is None
+            or time.monotonic() - _jwks_fetched_at > JWKS_REFRESH_SECONDS
+        )
+        if kid not in _jwks and refresh_due:
+            import urllib.request
+
+            region = get_session().region_name
+            url = f"https://cognito-idp.{region}.amazonaws.com/{user_pool_id}/.well-known/jwks.json"
+            try:
+                with urllib.request.urlopen(url, timeout=5) as response:
+                    keys = orjson.loads(response.read())["keys"]
+                signing_keys = {key["kid"]: jwt.PyJWK(key) for key in keys}
+            except (OSError, ValueError, KeyError, TypeError, jwt.PyJWTError) as e:
+                # URLError and timeouts are OSErrors, malformed JSON is a
+                # ValueError; either way the failure is on our side.
+                _LOG.error("Failed to fetch signing keys: %s", e)
+                raise_error_response(RESPONSE_SERVICE_UNAVAILABLE_CODE, "Service Unavailable")
+            _jwks_fetched_at = time.monotonic()
+            _jwks.clear()
+            _jwks.update(signing_keys)
+
+        if kid not in _jwks:
+            raise_error_response(RESPONSE_UNAUTHORIZED, "Unauthorized")
+        return _jwks[kid].key
+
+    def authorize_user(self, event: dict) -> dict:
+        import jwt
+
+        headers = event.get("headers") or {}
+        token = headers.get("Authorization") or headers.get("authorization")
+        if not token:
+            raise_error_response(RESPONSE_UNAUTHORIZED, "Unauthorized")
+        token = token.removeprefix("Bearer ")
 
-        return data
+        user_pool_id = self.get_user_pool_id(USER_POOL_NAME)
+        client_id = self.get_user_pool_client_id(user_pool_id)
+        region = get_session().region_name
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+            claims = jwt.decode(
+                token,
+                self.get_signing_key(user_pool_id, kid),
+                algorithms=["RS256"],
+                audience=client_id,
+                issuer=f"https://cognito-idp.{region}.amazonaws.com/{user_pool_id}",
+            )
+        except jwt.PyJWTError as e:
+            _LOG.error("Invalid token: %s", e)
+            raise_error_response(RESPONSE_UNAUTHORIZED, "Unauthorized")
+
+        if claims.get("token_use") != "id":
+            raise_error_response(RESPONSE_UNAUTHORIZED, "Unauthorized")
+        return claims
 
     def validate_email(self, email: str) -> None:
         
-        if not re.match(r"^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$", email):
+        if not _EMAIL_RE.match(email):
             raise ValueError("Invalid email")
 
     def validate_password(self, password: str) -> None:
         
-        if not re.match(r"^(?=.*[a-zA-Z])(?=.*\d)(?=.*[^\w\s]).{12,}$", password):
+        if not _PASSWORD_RE.match(password):
             raise ValueError("Invalid password")
     
     def signup(self, email: str, first_name: str, last_name: str, password: str) -> None:
-        _LOG.info(f"Signing up user: {email}")
+        _LOG.info("Signing up user: %s", email)
 
         self.validate_email(email)
         self.validate_password(password)
 
         user_pool_id = self.get_user_pool_id(USER_POOL_NAME)
 
-        response = cognito_client.admin_create_user(
+        response = get_cognito_client().admin_create_user(
             UserPoolId=user_pool_id,
             Username=email,
             UserAttributes=[
@@ -233,18 +426,18 @@ class ApiHandler(AbstractLambda):
             TemporaryPassword=password,
             MessageAction="SUPPRESS",
         )
-        _LOG.info(f"create user response: {response}")
+        _LOG.debug("create user response: %s", response)
 
-        response = cognito_client.admin_set_user_password(
+        response = get_cognito_client().admin_set_user_password(
             UserPoolId=user_pool_id,
             Username=email,
             Password=password,
             Permanent=True,
         )
-        _LOG.info(f"set user password response: {response}")
+        _LOG.debug("set user password response: %s", response)
 
     def signin(self, email: str, password: str) -> str:
-        _LOG.info(f"Signing in user: {email}")
+        _LOG.info("Signing in user: %s", email)
 
         self.validate_email(email)
         self.validate_password(password)
@@ -252,7 +445,7 @@ class ApiHandler(AbstractLambda):
         user_pool_id = self.get_user_pool_id(USER_POOL_NAME)
         client_id = self.get_user_pool_client_id(user_pool_id)
 
-        response = cognito_client.initiate_auth(
+        response = get_cognito_client().initiate_auth(
             ClientId=client_id,
             AuthFlow="USER_PASSWORD_AUTH",
             AuthParameters={
@@ -265,30 +458,64 @@ class ApiHandler(AbstractLambda):
 
     def get_tables(self) -> list[dict]:
         _LOG.info("Getting tables")
-        response = tables_table.scan()
-        tables = response["Items"]
-        tables = self.serialize(tables)
-        tables = sorted(tables, key=lambda table: table["id"])
-        return tables
+        paginator = get_dynamodb_client().get_paginator("scan")
+        pages = paginator.paginate(
+            TableName=TABLES_TABLE_NAME,
+            ProjectionExpression=TABLE_PROJECTION,
+            ExpressionAttributeNames=TABLE_ATTRIBUTE_NAMES,
+        )
+        items = itertools.chain.from_iterable(page["Items"] for page in pages)
+        return sorted(map(deserialize_item, items), key=operator.itemgetter("id"))
 
         
+    @staticmethod
+    def parse_slot_time(value: str) -> int:
+        """Converts an "HH:MM" slot time into minutes since midnight."""
+        match = _SLOT_TIME_RE.fullmatch(value)
+        if not match:
+            raise ValueError("Invalid slot time")
+        return int(match.group(1)) * 60 + int(match.group(2))
+
     def is_overlapping(
         self,
-        start1: str,
-        end1: str, 
-        start2: str,
-        end2: str,
+        start1: int,
+        end1: int, 
+        start2: int,
+        end2: int,
     ) -> bool:
-
-        start1 = datetime.datetime.strptime(start1, "%H:%M").time()
-        end1= datetime.datetime.strptime(end1, "%H:%M").time()
-        start2 = datetime.datetime.strptime(start2, "%H:%M").time()
-        end2 = datetime.datetime.strptime(end2, "%H:%M").time()
-
-        if start1 <= start2 <= end1 or start1 <= end2 <= end1:
-            return True
-
-        return False
+        # Slots are half-open, so a reservation may start exactly when
+        # the previous one ends.
+        return start1 < end2 and start2 < end1
+
+    def get_booked_slots(self, table_number: int, date: str) -> tuple[list[list[int]], t.Optional[int]]:
+        client = get_dynamodb_client()
+        response = client.get_item(
+            TableName=RESERVATION_LOCKS_TABLE_NAME,
+            Key=serialize_item({"id": f"{table_number}#{date}"}),
+            ConsistentRead=True,
+        )
+        if "Item" in response:
+            lock = deserialize_item(response["Item"])
+            slots = [[int(start), int(end)] for start, end in lock["slots"]]
+            return slots, int(lock["version"])
+
+        # Reservations made before locking was introduced have no lock item
+        # yet; they are read from the index once and seeded into a new one.
+        paginator = client.get_paginator("query")
+        pages = paginator.paginate(
+            TableName=RESERVATIONS_TABLE_NAME,
+            IndexName="TableDateIndex",
+            KeyConditionExpression="tableNumber = :table_number AND #d = :date",
+            ExpressionAttributeNames=RESERVATION_ATTRIBUTE_NAMES,
+            ExpressionAttributeValues=serialize_item({":table_number": table_number, ":date": date}),
+            ProjectionExpression="slotTimeStart, slotTimeEnd",
+        )
+        items = map(deserialize_item, itertools.chain.from_iterable(page["Items"] for page in pages))
+        slots = sorted(
+            [self.parse_slot_time(item["slotTimeStart"]), self.parse_slot_time(item["slotTimeEnd"])]
+            for item in items
+        )
+        return slots, None
 
 
     def create_table(
@@ -299,7 +526,7 @@ class ApiHandler(AbstractLambda):
         is_vip: bool,
         min_order: t.Optional[int] = None,
     ) -> int:
-        _LOG.info(f"Creating table: {id}")
+        _LOG.info("Creating table: %s", id)
         item = {
             "id": id,
             "number": number,
@@ -308,15 +535,18 @@ class ApiHandler(AbstractLambda):
         } 
         if min_order is not None:
             item["minOrder"] = min_order
-        tables_table.put_item(Item=item)
+        get_dynamodb_client().put_item(TableName=TABLES_TABLE_NAME, Item=serialize_item(item))
         return id 
     
     def get_table(self, table_id: int) -> dict:
-        _LOG.info(f"Getting table: {table_id}")
-        response = tables_table.get_item(Key={"id": table_id})
-        table = response["Item"]
-        table = self.serialize(table)
-        return table
+        _LOG.info("Getting table: %s", table_id)
+        response = get_dynamodb_client().get_item(
+            TableName=TABLES_TABLE_NAME,
+            Key=serialize_item({"id": table_id}),
+            ProjectionExpression=TABLE_PROJECTION,
+            ExpressionAttributeNames=TABLE_ATTRIBUTE_NAMES,
+        )
+        return deserialize_item(response["Item"])
 
     def create_reservation(
         self, 
@@ -327,24 +557,28 @@ class ApiHandler(AbstractLambda):
         slot_time_start: str,
         slot_time_end: str,
     ) -> str:
-        _LOG.info(f"Creating reservation for table: {table_number}")
-        response = tables_table.scan() 
-        tables = response["Items"]
-        for table in tables:
-            if table["number"] == table_number:
-                break
-        else:
+        from uuid import uuid4
+
+        _LOG.info("Creating reservation for table: %s", table_number)
+        client = get_dynamodb_client()
+        response = client.query(
+            TableName=TABLES_TABLE_NAME,
+            IndexName="NumberIndex",
+            KeyConditionExpression="#n = :number",
+            ExpressionAttributeNames=TABLE_ATTRIBUTE_NAMES,
+            ExpressionAttributeValues=serialize_item({":number": table_number}),
+            ProjectionExpression="id",
+            Limit=1,
+        )
+        if not response["Items"]:
             raise ValueError(f"Table {table_number} not found")
 
-        reservations = self.get_reservations()
-        for reservation in reservations:
-            if reservation["tableNumber"] == table_number and reservation["date"] == date:
-                reservation_start = reservation["slotTimeStart"]
-                reservation_end = reservation["slotTimeEnd"]
-                if self.is_overlapping(reservation_start, reservation_end, slot_time_start, slot_time_end):
-                    raise ValueError("Reservation time is overlapping with another reservation")
+        start = self.parse_slot_time(slot_time_start)
+        end = self.parse_slot_time(slot_time_end)
+        if start >= end:
+            raise ValueError("Reservation time range is invalid")
 
-        reservation_id = str(uuid.uuid4())
+        reservation_id = str(uuid4())
         item = {
             "id": reservation_id,
             "tableNumber": table_number,
@@ -354,15 +588,87 @@ class ApiHandler(AbstractLambda):
             "slotTimeStart": slot_time_start,
             "slotTimeEnd": slot_time_end,
         }
-        reservations_table.put_item(Item=item)
-        return reservation_id
 
-    def get_reservations(self) -> list[dict]:
+        for _ in range(LOCK_ATTEMPTS):
+            slots, version = self.get_booked_slots(table_number, date)
+            for reservation_start, reservation_end in slots:
+                if self.is_overlapping(reservation_start, reservation_end, start, end):
+                    raise ValueError("Reservation time is overlapping with another reservation")
+            bisect.insort(slots, [start, end])
+
+            lock_put = {
+                "TableName": RESERVATION_LOCKS_TABLE_NAME,
+                "Item": serialize_item({
+                    "id": f"{table_number}#{date}",
+                    "slots": slots,
+                    "version": (version or 0) + 1,
+                }),
+            }
+            if version is None:
+                lock_put["ConditionExpression"] = "attribute_not_exists(id)"
+            else:
+                lock_put["ConditionExpression"] = "version = :version"
+                lock_put["ExpressionAttributeValues"] = serialize_item({":version": version})
+
+            try:
+                client.transact_write_items(TransactItems=[
+                    {
+                        "Put": {
+                            "TableName": RESERVATIONS_TABLE_NAME,
+                            "Item": serialize_item(item),
+                            "ConditionExpression": "attribute_not_exists(id)",
+                        }
+                    },
+                    {"Put": lock_put},
+                ])
+                return reservation_id
+            except client.exceptions.TransactionCanceledException as e:
+                reasons = e.response.get("CancellationReasons", [])
+                if not any(reason.get("Code") == "ConditionalCheckFailed" for reason in reasons):
+                    raise
+                # Another booking for this table and day won the race; re-read
+                # its slots and check again.
+                _LOG.info("Lock for table %s on %s changed, retrying", table_number, date)
+
+        raise ValueError("Reservation could not be saved due to concurrent bookings")
+
+    def get_reservations(self) -> t.Iterator[dict]:
         _LOG.info("Getting reservations")
-        response = reservations_table.scan()
-        reservations = response["Items"]
-        reservations = self.serialize(reservations)
-        return reservations
+        paginator = get_dynamodb_client().get_paginator("scan")
+        pages = paginator.paginate(
+            TableName=RESERVATIONS_TABLE_NAME,
+            ProjectionExpression=RESERVATION_PROJECTION,
+            ExpressionAttributeNames=RESERVATION_ATTRIBUTE_NAMES,
+        )
+        items = itertools.chain.from_iterable(page["Items"] for page in pages)
+        return map(deserialize_item, items)
+
+
+_ROUTES = {
+    ("POST", "/signup"): ApiHandler._handle_signup,
+    ("POST", "/signin"): ApiHandler._handle_signin,
+    ("GET", "/tables"): ApiHandler._handle_list_tables,
+    ("POST", "/tables"): ApiHandler._handle_create_table,
+    ("POST", "/reservations"): ApiHandler._handle_create_reservation,
+    ("GET", "/reservations"): ApiHandler._handle_list_reservations,
+}
+_PUBLIC_ROUTES = {
+    ("POST", "/signup"),
+    ("POST", "/signin"),
+}
+_PARAM_ROUTES = [
+    ("GET", _TABLE_ID_RE, ApiHandler._handle_get_table),
+]
+
+# Provisioned-concurrency environments initialize ahead of any request, so
+# they build every client up front and open the DynamoDB connection with a
+# cheap call.
+if os.environ.get("AWS_LAMBDA_INITIALIZATION_TYPE") == "provisioned-concurrency":
+    get_cognito_client()
+    try:
+        get_dynamodb_client().describe_endpoints()
+    except Exception as e:
+        _LOG.warning("Failed to pre-warm DynamoDB connection: %s", e)
 
 HANDLER = ApiHandler()
 